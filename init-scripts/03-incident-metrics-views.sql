@@ -0,0 +1,48 @@
+-- ============================================================================
+-- Pre-aggregated metrics for GET /incidents/metrics
+-- The incident-management service refreshes these views every 60 seconds,
+-- turning the dashboard queries into cheap reads regardless of table size.
+-- ============================================================================
+
+-- Average response/resolution/total times over resolved incidents
+CREATE MATERIALIZED VIEW IF NOT EXISTS incident_avg_times_mv AS
+SELECT
+    1 AS id,
+    AVG(response_time_seconds) AS avg_response_time,
+    AVG(resolution_time_seconds) AS avg_resolution_time,
+    AVG(total_time_seconds) AS avg_total_time
+FROM incidents
+WHERE status = 'RESOLVED';
+
+-- Incident counts by severity
+CREATE MATERIALIZED VIEW IF NOT EXISTS incident_severity_counts_mv AS
+SELECT severity, COUNT(*) AS count
+FROM incidents
+GROUP BY severity;
+
+-- Incident counts by status
+CREATE MATERIALIZED VIEW IF NOT EXISTS incident_status_counts_mv AS
+SELECT status, COUNT(*) AS count
+FROM incidents
+GROUP BY status;
+
+-- Per-employee performance over resolved incidents
+CREATE MATERIALIZED VIEW IF NOT EXISTS employee_performance_mv AS
+SELECT
+    e.employee_id,
+    e.name,
+    e.role,
+    COUNT(i.incident_id) AS incidents_handled,
+    AVG(i.response_time_seconds) AS avg_response_seconds,
+    AVG(i.resolution_time_seconds) AS avg_resolution_seconds
+FROM incidents i
+JOIN employees e ON i.resolved_by_employee_id = e.employee_id
+WHERE i.status = 'RESOLVED'
+GROUP BY e.employee_id, e.name, e.role;
+
+-- Unique indexes so REFRESH MATERIALIZED VIEW CONCURRENTLY can be used
+-- (readers keep seeing the old snapshot during a refresh)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_incident_avg_times_mv ON incident_avg_times_mv (id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_incident_severity_counts_mv ON incident_severity_counts_mv (severity);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_incident_status_counts_mv ON incident_status_counts_mv (status);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_employee_performance_mv ON employee_performance_mv (employee_id);
@@ -0,0 +1,9 @@
+import os
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    """Remove a dead worker's mmapped metric files from the multiprocess dir."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,11 @@
+# Must run before anything imports socket/ssl: with gunicorn's gevent workers
+# every blocking psycopg2/requests/pika call then yields to the event loop
+# instead of pinning the worker
+from gevent import monkey
+monkey.patch_all()
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
 from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
 import psycopg2
@@ -7,19 +15,40 @@ import pika
 import os
 import time
 import threading
+import types
 import random
+import uuid
+import queue
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from datetime import datetime
+from contextlib import contextmanager
 from dotenv import load_dotenv
-import json
+import orjson
 import requests
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from requests.adapters import HTTPAdapter, Retry
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, multiprocess
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# Prometheus Metrics
+def ojsonify(obj, status=200):
+    """jsonify replacement backed by orjson (C-speed datetime encoding, emits bytes).
+
+    Used on the endpoints with the biggest payloads; default=str covers the
+    Decimals coming back from AVG() aggregates.
+    """
+    return Response(orjson.dumps(obj, default=str), status=status, mimetype='application/json')
+
+# Prometheus Metrics. With gunicorn each worker holds its own registry, so
+# when PROMETHEUS_MULTIPROC_DIR is set (see the Dockerfile) prometheus_client
+# backs these with mmapped files that /metrics aggregates across workers.
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
 incidents_total = Counter('incidents_total', 'Total incidents created', ['severity'])
 incident_mtta_seconds = Histogram('incident_mtta_seconds', 'Mean Time To Acknowledge', buckets=[5, 10, 30, 60, 300, 600])
 incident_mttr_seconds = Histogram('incident_mttr_seconds', 'Mean Time To Resolve', buckets=[60, 300, 600, 1800, 3600, 7200])
@@ -30,8 +59,20 @@ RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'localhost')
 ONCALL_SERVICE_URL = os.getenv('ONCALL_SERVICE_URL', 'http://localhost:8003')
 NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL', 'http://notification-service:8004')
 
+# Shared HTTP session so calls to the oncall/notification services reuse
+# warm keep-alive connections instead of a fresh TCP handshake per request
+HTTP = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504))
+)
+HTTP.mount('http://', _http_adapter)
+HTTP.mount('https://', _http_adapter)
+HTTP.headers.update({'Connection': 'keep-alive'})
+
 # Alert type to role mapping with priority order
-ALERT_ROLE_MAPPING = {
+_RAW_ALERT_ROLE_MAPPING = {
     # CARDIAC/CARDIOVASCULAR
     'CARDIAC_ARREST': ['EMERGENCY_DOCTOR', 'CARDIOLOGIST'],
     'CARDIAC_ABNORMAL': ['EMERGENCY_DOCTOR', 'CARDIOLOGIST'],
@@ -89,6 +130,11 @@ ALERT_ROLE_MAPPING = {
     'SUICIDE_RISK': ['PSYCHIATRIST', 'NURSE', 'EMERGENCY_DOCTOR']
 }
 
+# Frozen at import: tuples are cheaper to iterate than lists and the proxy
+# makes the mapping read-only on the assignment hot path
+ALERT_ROLE_MAPPING = types.MappingProxyType({k: tuple(v) for k, v in _RAW_ALERT_ROLE_MAPPING.items()})
+_DEFAULT_ROLES = ('NURSE',)
+
 # Connection pool (initialized lazily)
 db_pool = None
 
@@ -97,149 +143,219 @@ def init_db_pool():
     global db_pool
     if db_pool is None:
         try:
-            db_pool = ThreadedConnectionPool(2, 10, DATABASE_URL)
+            # Sized per gunicorn worker: 4 workers x 20 = 80 connections worst
+            # case, leaving headroom for the other services under the
+            # max_connections=200 set in docker-compose
+            db_pool = ThreadedConnectionPool(2, 20, DATABASE_URL)
             print("✅ Database connection pool initialized")
         except Exception as e:
             print(f"❌ Error: Failed to initialize connection pool: {e}")
 
-def get_db_connection():
-    """Get database connection from pool."""
+# Hot-path statements prepared once per pooled connection so Postgres skips
+# the parse/plan step on every subsequent EXECUTE
+_PREPARED_STATEMENTS = (
+    """
+    PREPARE hist_ins AS
+    INSERT INTO incident_history (incident_id, employee_id, employee_name, action, previous_status, new_status, note, timestamp)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, NOW())
+    """,
+    """
+    PREPARE inc_ack AS
+    UPDATE incidents AS i
+    SET status = 'ACKNOWLEDGED',
+        acknowledged_at = NOW(),
+        response_time_seconds = EXTRACT(EPOCH FROM (NOW() - i.created_at))
+    FROM incidents AS old
+    WHERE old.incident_id = i.incident_id
+      AND i.incident_id = $1
+      AND i.status IN ('ASSIGNED', 'OPEN')
+    RETURNING i.*, old.status AS prev_status
+    """,
+    """
+    PREPARE inc_start AS
+    UPDATE incidents
+    SET status = 'IN_PROGRESS',
+        in_progress_at = NOW()
+    WHERE incident_id = $1 AND status = 'ACKNOWLEDGED'
+    RETURNING *
+    """,
+    """
+    PREPARE inc_resolve AS
+    UPDATE incidents AS i
+    SET status = 'RESOLVED',
+        resolved_at = NOW(),
+        resolution_notes = $1,
+        resolved_by_employee_id = $2,
+        resolution_time_seconds = EXTRACT(EPOCH FROM (NOW() - i.acknowledged_at)),
+        total_time_seconds = EXTRACT(EPOCH FROM (NOW() - i.created_at))
+    FROM incidents AS old
+    WHERE old.incident_id = i.incident_id
+      AND i.incident_id = $3
+      AND i.status != 'RESOLVED'
+    RETURNING i.*, old.status AS prev_status
+    """,
+)
+# WeakSet so a connection the pool closes and discards drops out on its own;
+# a fresh connection reusing the same memory is never mistaken for a prepared
+# one (which keying on id() would do)
+_prepared_conns = weakref.WeakSet()
+
+def _prepare_statements(conn):
+    """Run PREPARE for the hot-path statements on a freshly checked-out connection."""
+    cur = conn.cursor()
+    for statement in _PREPARED_STATEMENTS:
+        cur.execute(statement)
+    conn.commit()
+    cur.close()
+
+@contextmanager
+def get_conn():
+    """Check a connection out of the pool, always returning it when done."""
     global db_pool
+    if db_pool is None:
+        init_db_pool()
+    if db_pool is None:
+        raise RuntimeError('Database connection failed')
+    conn = db_pool.getconn()
     try:
-        if db_pool is None:
-            init_db_pool()
-        if db_pool:
-            return db_pool.getconn()
-        return None
-    except Exception as e:
-        print(f"❌ Error: Database connection failed: {e}")
-        return None
-
-def return_db_connection(conn):
-    """Return a connection to the pool."""
-    if db_pool and conn:
+        if conn not in _prepared_conns:
+            _prepare_statements(conn)
+            _prepared_conns.add(conn)
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         db_pool.putconn(conn)
 
 def add_to_history(incident_id, employee_id, employee_name, action, previous_status=None, new_status=None, note=None):
     """Add entry to incident history for audit trail."""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return False
-        
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO incident_history (incident_id, employee_id, employee_name, action, previous_status, new_status, note, timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (incident_id, employee_id, employee_name, action, previous_status, new_status, note, datetime.now()))
-        
-        conn.commit()
-        cur.close()
-        return_db_connection(conn)
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("EXECUTE hist_ins (%s, %s, %s, %s, %s, %s, %s)",
+                        (incident_id, employee_id, employee_name, action, previous_status, new_status, note))
+
+            conn.commit()
+            cur.close()
         return True
     except Exception as e:
         print(f"❌ Error adding to history: {e}")
         return False
 
-def calculate_time_metrics(incident_id):
-    """Calculate and update time metrics for an incident."""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return
-        
-        response_time = None
-        resolution_time = None
-        total_time = None
-        
-        # Calculate response time (OPEN → ACKNOWLEDGED)
-        if incident['acknowledged_at'] and incident['created_at']:
-            response_time = (incident['acknowledged_at'] - incident['created_at']).total_seconds()
-        
-        # Calculate resolution time (ACKNOWLEDGED → RESOLVED)
-        if incident['resolved_at'] and incident['acknowledged_at']:
-            resolution_time = (incident['resolved_at'] - incident['acknowledged_at']).total_seconds()
-        
-        # Calculate total time (OPEN → RESOLVED)
-        if incident['resolved_at'] and incident['created_at']:
-            total_time = (incident['resolved_at'] - incident['created_at']).total_seconds()
-        
-        # Update metrics
-        cur.execute("""
-            UPDATE incidents 
-            SET response_time_seconds = %s,
-                resolution_time_seconds = %s,
-                total_time_seconds = %s
-            WHERE incident_id = %s
-        """, (response_time, resolution_time, total_time, incident_id))
-        
-        conn.commit()
-        cur.close()
-        return_db_connection(conn)
-        
-    except Exception as e:
-        print(f"❌ Error calculating time metrics: {e}")
+def _declare_topology(channel):
+    """Declare the queues this service uses.
+
+    queue_declare is a synchronous AMQP round trip, so it runs exactly once per
+    channel open (consumer reconnect or publisher reconnect) and never on the
+    publish path.
+    """
+    channel.queue_declare(queue='alerts', durable=True)
+    channel.queue_declare(queue='notifications', durable=True)
+
+# Persistent publisher connection/channel, guarded by a lock because pika's
+# BlockingConnection is not thread-safe
+_publisher_lock = threading.Lock()
+_publisher_connection = None
+_publisher_channel = None
+
+def _get_publisher_channel():
+    """Get the shared publisher channel, (re)connecting lazily. Caller must hold _publisher_lock."""
+    global _publisher_connection, _publisher_channel
+    if _publisher_channel is not None and _publisher_channel.is_open:
+        return _publisher_channel
+    _publisher_connection = get_rabbitmq_connection()
+    if not _publisher_connection:
+        return None
+    _publisher_channel = _publisher_connection.channel()
+    _declare_topology(_publisher_channel)
+    _publisher_channel.confirm_delivery()
+    return _publisher_channel
 
 def publish_notification(notification_data):
     """Publish notification request to RabbitMQ notifications queue."""
+    global _publisher_channel
+    message = orjson.dumps(notification_data, default=str)
+
+    with _publisher_lock:
+        # One attempt on the warm channel, one more after a reconnect
+        for attempt in range(2):
+            try:
+                channel = _get_publisher_channel()
+                if not channel:
+                    print("❌ Failed to publish notification: No RabbitMQ connection")
+                    return False
+
+                channel.basic_publish(
+                    exchange='',
+                    routing_key='notifications',
+                    body=message,
+                    properties=pika.BasicProperties(delivery_mode=2)
+                )
+
+                print(f"✅ Notification published to queue for employee {notification_data.get('employee_id')}")
+                return True
+
+            except pika.exceptions.AMQPError as e:
+                # Drop the dead channel so the next attempt reconnects
+                _publisher_channel = None
+                if attempt == 0:
+                    print(f"⚠️  Publisher channel lost, reconnecting: {e}")
+                else:
+                    print(f"❌ Error publishing notification: {e}")
+            except Exception as e:
+                print(f"❌ Error publishing notification: {e}")
+                return False
+
+    return False
+
+# Notifications are published off the critical path: callers enqueue here and
+# a daemon thread drains onto the persistent publisher channel
+_notification_queue = queue.Queue(maxsize=10_000)
+
+def queue_notification(notification_data):
+    """Hand a notification to the async publisher; drops (with a log) if the queue is full."""
     try:
-        connection = get_rabbitmq_connection()
-        if not connection:
-            print("❌ Failed to publish notification: No RabbitMQ connection")
-            return False
-        
-        channel = connection.channel()
-        channel.queue_declare(queue='notifications', durable=True)
-        
-        message = json.dumps(notification_data, default=str)
-        channel.basic_publish(
-            exchange='',
-            routing_key='notifications',
-            body=message,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        
-        connection.close()
-        print(f"✅ Notification published to queue for employee {notification_data.get('employee_id')}")
+        _notification_queue.put_nowait(notification_data)
         return True
-        
-    except Exception as e:
-        print(f"❌ Error publishing notification: {e}")
+    except queue.Full:
+        print(f"⚠️  Notification queue full, dropping notification for employee {notification_data.get('employee_id')}")
         return False
 
+def notification_publisher_thread():
+    """Background thread that drains queued notifications onto RabbitMQ."""
+    print("🚀 Notification publisher thread started")
+    while True:
+        notification_data = _notification_queue.get()
+        try:
+            publish_notification(notification_data)
+        except Exception as e:
+            print(f"❌ Error publishing queued notification: {e}")
+        finally:
+            _notification_queue.task_done()
+
 def get_staff_workload(employee_id):
     """Get current workload for a staff member."""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return {'total': 999, 'in_progress': 999}
-        
-        cur = conn.cursor()
-        
-        # Count total active incidents
-        cur.execute("""
-            SELECT COUNT(*) FROM incidents 
-            WHERE assigned_employee_id = %s AND status != 'RESOLVED'
-        """, (employee_id,))
-        total_active = cur.fetchone()[0]
-        
-        # Count in-progress incidents
-        cur.execute("""
-            SELECT COUNT(*) FROM incidents 
-            WHERE assigned_employee_id = %s AND status = 'IN_PROGRESS'
-        """, (employee_id,))
-        in_progress = cur.fetchone()[0]
-        
-        cur.close()
-        return_db_connection(conn)
-        
+        with get_conn() as conn:
+            cur = conn.cursor()
+
+            # Count total active incidents
+            cur.execute("""
+                SELECT COUNT(*) FROM incidents
+                WHERE assigned_employee_id = %s AND status != 'RESOLVED'
+            """, (employee_id,))
+            total_active = cur.fetchone()[0]
+
+            # Count in-progress incidents
+            cur.execute("""
+                SELECT COUNT(*) FROM incidents
+                WHERE assigned_employee_id = %s AND status = 'IN_PROGRESS'
+            """, (employee_id,))
+            in_progress = cur.fetchone()[0]
+
+            cur.close()
+
         return {'total': total_active, 'in_progress': in_progress}
     except Exception as e:
         print(f"❌ Error getting workload: {e}")
@@ -247,33 +363,30 @@ def get_staff_workload(employee_id):
 
 def assign_incident_to_staff(incident_id, staff, alert_type, role, workload):
     """Assign an incident to a specific staff member."""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    cur = conn.cursor()
+    with get_conn() as conn:
+        cur = conn.cursor()
 
-    cur.execute("""
-        UPDATE incidents
-        SET assigned_to = %s, assigned_employee_id = %s, assigned_at = %s, status = 'ASSIGNED'
-        WHERE incident_id = %s
-    """, (staff['name'], staff['employee_id'], datetime.now(), incident_id))
+        cur.execute("""
+            UPDATE incidents
+            SET assigned_to = %s, assigned_employee_id = %s, assigned_at = NOW(), status = 'ASSIGNED'
+            WHERE incident_id = %s
+        """, (staff['name'], staff['employee_id'], incident_id))
 
-    cur.execute("""
-        INSERT INTO incident_assignments (incident_id, employee_id, employee_name, is_primary)
-        VALUES (%s, %s, %s, TRUE)
-        ON CONFLICT (incident_id, employee_id) DO NOTHING
-    """, (incident_id, staff['employee_id'], staff['name']))
+        cur.execute("""
+            INSERT INTO incident_assignments (incident_id, employee_id, employee_name, is_primary)
+            VALUES (%s, %s, %s, TRUE)
+            ON CONFLICT (incident_id, employee_id) DO NOTHING
+        """, (incident_id, staff['employee_id'], staff['name']))
 
-    conn.commit()
-    cur.close()
-    return_db_connection(conn)
+        conn.commit()
+        cur.close()
 
     print(f"✅ Assigned {incident_id} to {staff['name']} ({role}) [Workload: {workload['in_progress']} in-progress, {workload['total']} total]")
 
     add_to_history(incident_id, staff['employee_id'], staff['name'], 'ASSIGNED', 'OPEN', 'ASSIGNED',
                    f"Auto-assigned to {role} (least busy: {workload['total']} active incidents)")
 
-    publish_notification({
+    queue_notification({
         'type': 'INCIDENT_ASSIGNED',
         'employee_id': staff['employee_id'],
         'employee_name': staff['name'],
@@ -304,33 +417,64 @@ def pick_least_busy_staff(available_staff, role_label):
     print(f"   → Selected: {selected['staff']['name']} (least busy)")
     return selected['staff'], selected['workload']
 
+# Fans out the oncall probes for the role tiers of a single alert
+_oncall_executor = ThreadPoolExecutor(max_workers=8)
+
+# Rosters only change on shift boundaries, so a few seconds of staleness is
+# safe and keeps alert storms from hammering the oncall service
+_oncall_cache = TTLCache(maxsize=64, ttl=5)
+_oncall_cache_lock = threading.RLock()
+
+def _fetch_oncall_staff(role):
+    """Fetch the currently on-call staff for a role. Returns [] on any failure."""
+    with _oncall_cache_lock:
+        staff = _oncall_cache.get(role)
+    if staff is not None:
+        return staff
+
+    try:
+        response = HTTP.get(
+            f"{ONCALL_SERVICE_URL}/oncall/current",
+            params={'role': role},
+            timeout=5
+        )
+        if response.status_code == 200:
+            staff = response.json() or []
+            with _oncall_cache_lock:
+                _oncall_cache[role] = staff
+            return staff
+    except Exception as e:
+        print(f"⚠️  Error checking role {role}: {e}")
+    return []
+
+def _invalidate_oncall_cache(role):
+    """Drop a cached roster after an assignment so the next alert re-reads workloads."""
+    with _oncall_cache_lock:
+        _oncall_cache.pop(role, None)
+
 def auto_assign_incident(incident_id, alert_type):
     """Assign incident using smart load-balancing strategy based on current workload."""
     try:
-        role_priorities = ALERT_ROLE_MAPPING.get(alert_type, ['NURSE'])
+        role_priorities = ALERT_ROLE_MAPPING.get(alert_type, _DEFAULT_ROLES)
 
-        # Step 1: Try to find logged-in staff for each specific role
+        # Step 1: Probe all role tiers concurrently instead of blocking up to
+        # 5s per role, then honor the priority order when picking a match
+        futures = {role: _oncall_executor.submit(_fetch_oncall_staff, role) for role in role_priorities}
         for role in role_priorities:
-            try:
-                response = requests.get(
-                    f"{ONCALL_SERVICE_URL}/oncall/current",
-                    params={'role': role},
-                    timeout=5
-                )
-
-                if response.status_code == 200:
-                    available_staff = response.json()
-                    if available_staff and len(available_staff) > 0:
-                        staff, workload = pick_least_busy_staff(available_staff, role)
-                        return assign_incident_to_staff(incident_id, staff, alert_type, role, workload)
-            except Exception as e:
-                print(f"⚠️  Error checking role {role}: {e}")
-                continue
+            available_staff = futures[role].result()
+            if available_staff:
+                for pending in futures.values():
+                    pending.cancel()
+                staff, workload = pick_least_busy_staff(available_staff, role)
+                assigned = assign_incident_to_staff(incident_id, staff, alert_type, role, workload)
+                if assigned:
+                    _invalidate_oncall_cache(role)
+                return assigned
 
         # Step 2: Fallback - try ANY logged-in employee regardless of role
         print(f"⚠️  No specific role match for {alert_type}, trying any logged-in employee...")
         try:
-            response = requests.get(
+            response = HTTP.get(
                 f"{ONCALL_SERVICE_URL}/oncall/schedules",
                 timeout=5
             )
@@ -350,32 +494,36 @@ def auto_assign_incident(incident_id, alert_type):
         print(f"❌ Error: Auto-assignment failed for incident {incident_id}: {e}")
         return False
 
+def new_incident_id():
+    """Generate a unique, time-sortable incident ID.
+
+    The millisecond prefix keeps IDs ordered for dashboards while the random
+    suffix makes two alerts in the same millisecond collision-free (the old
+    bare-timestamp IDs hit primary-key conflicts under load).
+    """
+    return f"INC-{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+
 def create_incident_from_alert(alert_data):
     """Create an incident from an alert."""
     try:
-        incident_id = f"INC-{int(time.time() * 1000)}"
-        
-        conn = get_db_connection()
-        if not conn:
-            return None
-            
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO incidents (incident_id, alert_id, patient_id, room, alert_type, status, severity, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            incident_id,
-            alert_data['alert_id'],
-            alert_data['patient_id'],
-            alert_data.get('room'),
-            alert_data.get('alert_type'),
-            'OPEN',
-            alert_data['severity'],
-            datetime.now()
-        ))
-        conn.commit()
-        cur.close()
-        return_db_connection(conn)
+        incident_id = new_incident_id()
+
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO incidents (incident_id, alert_id, patient_id, room, alert_type, status, severity, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            """, (
+                incident_id,
+                alert_data['alert_id'],
+                alert_data['patient_id'],
+                alert_data.get('room'),
+                alert_data.get('alert_type'),
+                'OPEN',
+                alert_data['severity']
+            ))
+            conn.commit()
+            cur.close()
         
         print(f"✅ Created incident: {incident_id} from alert {alert_data['alert_id']}")
 
@@ -394,14 +542,70 @@ def create_incident_from_alert(alert_data):
         print(f"❌ Error: Failed to create incident: {e}")
         return None
 
+_ALERT_REQUIRED_FIELDS = ('alert_id', 'patient_id', 'severity', 'alert_type')
+_VALID_SEVERITIES = frozenset({'LOW', 'MEDIUM', 'HIGH', 'CRITICAL'})
+
+# Recently-seen alert IDs: replayed deliveries are acked and dropped here
+# instead of burning a DB connection on a doomed duplicate insert
+_seen_alerts = TTLCache(maxsize=10_000, ttl=300)
+_seen_alerts_lock = threading.Lock()
+
+def validate_alert(alert_data):
+    """Return an error string for a malformed alert, or None if it is usable."""
+    if not isinstance(alert_data, dict):
+        return 'payload is not an object'
+    for field in _ALERT_REQUIRED_FIELDS:
+        if not alert_data.get(field):
+            return f'missing field {field}'
+    if alert_data['severity'] not in _VALID_SEVERITIES:
+        return f"invalid severity {alert_data['severity']}"
+    return None
+
+# Batched consumer acks: instead of one broker round trip per message, ack
+# every _ACK_BATCH_SIZE messages (or every _ACK_INTERVAL seconds via a timer
+# on the consumer connection) with a single multi-ack
+_ACK_BATCH_SIZE = 32
+_ACK_INTERVAL = 0.2
+_pending_ack_tag = None
+_pending_ack_count = 0
+
+def _flush_acks(ch):
+    """Multi-ack everything processed since the last flush."""
+    global _pending_ack_tag, _pending_ack_count
+    if _pending_ack_tag is not None and ch.is_open:
+        ch.basic_ack(delivery_tag=_pending_ack_tag, multiple=True)
+        _pending_ack_tag = None
+        _pending_ack_count = 0
+
 def process_alert_message(ch, method, properties, body):
     """Callback function to process alerts from RabbitMQ."""
+    global _pending_ack_tag, _pending_ack_count
     try:
-        alert_data = json.loads(body)
-        create_incident_from_alert(alert_data)
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        alert_data = orjson.loads(body)
+
+        # Reject malformed or replayed alerts cheaply, before any DB work
+        error = validate_alert(alert_data)
+        if error:
+            print(f"⚠️  Dropping malformed alert: {error}")
+        else:
+            alert_id = alert_data['alert_id']
+            with _seen_alerts_lock:
+                duplicate = alert_id in _seen_alerts
+                _seen_alerts[alert_id] = True
+            if duplicate:
+                print(f"⚠️  Dropping duplicate alert {alert_id}")
+            else:
+                create_incident_from_alert(alert_data)
+
+        _pending_ack_tag = method.delivery_tag
+        _pending_ack_count += 1
+        if _pending_ack_count >= _ACK_BATCH_SIZE:
+            _flush_acks(ch)
     except Exception as e:
         print(f"❌ Error: Failed to process alert message: {e}")
+        # Earlier messages in the batch did succeed: ack them first, then
+        # reject only the failing one
+        _flush_acks(ch)
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
 
 def get_rabbitmq_connection():
@@ -420,9 +624,14 @@ def get_rabbitmq_connection():
 
 def rabbitmq_consumer_thread():
     """Background thread that listens to RabbitMQ alerts queue."""
+    global _pending_ack_tag, _pending_ack_count
     print("🚀 RabbitMQ consumer thread started")
     while True:
         try:
+            # Delivery tags are per-channel; forget any batch from a dead one
+            _pending_ack_tag = None
+            _pending_ack_count = 0
+
             connection = get_rabbitmq_connection()
             if not connection:
                 print("❌ Error: Could not establish RabbitMQ connection, retrying in 10s...")
@@ -430,10 +639,17 @@ def rabbitmq_consumer_thread():
                 continue
                 
             channel = connection.channel()
-            channel.queue_declare(queue='alerts', durable=True)
-            channel.basic_qos(prefetch_count=1)
+            _declare_topology(channel)
+            channel.basic_qos(prefetch_count=64)
             channel.basic_consume(queue='alerts', on_message_callback=process_alert_message)
-            
+
+            # Flush partial ack batches on a timer so a quiet queue never
+            # leaves messages unacked for longer than _ACK_INTERVAL
+            def _periodic_ack_flush():
+                _flush_acks(channel)
+                connection.call_later(_ACK_INTERVAL, _periodic_ack_flush)
+            connection.call_later(_ACK_INTERVAL, _periodic_ack_flush)
+
             print("✅ Listening for alerts on RabbitMQ queue 'alerts'")
             channel.start_consuming()
             
@@ -441,10 +657,47 @@ def rabbitmq_consumer_thread():
             print(f"❌ Error: RabbitMQ consumer error: {e}")
             time.sleep(10)
 
-# Start background thread
+# Materialized views behind GET /incidents/metrics (see init-scripts/03)
+_METRICS_MATERIALIZED_VIEWS = (
+    'incident_avg_times_mv',
+    'incident_severity_counts_mv',
+    'incident_status_counts_mv',
+    'employee_performance_mv',
+)
+METRICS_REFRESH_INTERVAL_SECONDS = 60
+
+def metrics_refresh_thread():
+    """Background thread that refreshes the metrics materialized views every minute."""
+    print("🚀 Metrics refresh thread started")
+    while True:
+        time.sleep(METRICS_REFRESH_INTERVAL_SECONDS)
+        try:
+            with get_conn() as conn:
+                # REFRESH ... CONCURRENTLY refuses to run inside a transaction
+                # block, so escape psycopg2's implicit BEGIN for the duration
+                # (and restore the mode before the pool reuses the connection)
+                conn.autocommit = True
+                try:
+                    cur = conn.cursor()
+                    for view in _METRICS_MATERIALIZED_VIEWS:
+                        # CONCURRENTLY keeps readers on the old snapshot during refresh
+                        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                    cur.close()
+                finally:
+                    conn.autocommit = False
+        except Exception as e:
+            print(f"❌ Error refreshing metrics views: {e}")
+
+# Start background threads
 consumer_thread = threading.Thread(target=rabbitmq_consumer_thread, daemon=True)
 consumer_thread.start()
 
+metrics_thread = threading.Thread(target=metrics_refresh_thread, daemon=True)
+metrics_thread.start()
+
+notification_thread = threading.Thread(target=notification_publisher_thread, daemon=True)
+notification_thread.start()
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'service': 'incident-service'}), 200
@@ -452,30 +705,73 @@ def health():
 @app.route('/metrics', methods=['GET'])
 def prometheus_metrics():
     """Prometheus metrics endpoint."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        # Aggregate the per-worker metric files so any worker can serve a
+        # complete scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
 @app.route('/incidents', methods=['GET'])
 def get_incidents():
-    """Get all incidents with optional status filter."""
+    """Get incidents with optional status filter and keyset pagination.
+
+    Accepts ?limit= (default 100, capped at 500) and ?before=<ISO timestamp>;
+    when a full page is returned, a Link header carries the next-page cursor.
+    """
     try:
         status_filter = request.args.get('status')
 
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        before = None
+        if request.args.get('before'):
+            try:
+                before = datetime.fromisoformat(request.args['before'])
+            except ValueError:
+                return jsonify({'error': 'before must be an ISO timestamp'}), 400
 
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        if limit < 1:
+            return jsonify({'error': 'limit must be positive'}), 400
 
+        # Keyset pagination on created_at: the (status, created_at DESC) index
+        # serves filter, cursor and sort without scanning the whole table
+        query = "SELECT * FROM incidents"
+        conditions = []
+        params = []
         if status_filter:
-            cur.execute("SELECT * FROM incidents WHERE status = %s ORDER BY created_at DESC", (status_filter,))
-        else:
-            cur.execute("SELECT * FROM incidents ORDER BY created_at DESC")
+            conditions.append("status = %s")
+            params.append(status_filter)
+        if before:
+            conditions.append("created_at < %s")
+            params.append(before)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT %s"
+        params.append(limit)
 
-        incidents = cur.fetchall()
-        cur.close()
-        return_db_connection(conn)
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(query, params)
+            incidents = cur.fetchall()
+            cur.close()
+
+        response = ojsonify(incidents)
+
+        # Full page means there may be more: hand the client the next cursor
+        if len(incidents) == limit:
+            next_url = f"{request.base_url}?limit={limit}&before={incidents[-1]['created_at'].isoformat()}"
+            if status_filter:
+                next_url += f"&status={status_filter}"
+            response.headers['Link'] = f'<{next_url}>; rel="next"'
 
-        return jsonify(incidents), 200
+        return response
 
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -485,73 +781,44 @@ def get_incidents():
 def get_metrics():
     """Get performance metrics."""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Average times
-        cur.execute("""
-            SELECT
-                AVG(response_time_seconds) as avg_response_time,
-                AVG(resolution_time_seconds) as avg_resolution_time,
-                AVG(total_time_seconds) as avg_total_time
-            FROM incidents
-            WHERE status = 'RESOLVED'
-        """)
-        times = cur.fetchone()
-
-        # Count by severity
-        cur.execute("""
-            SELECT severity, COUNT(*) as count
-            FROM incidents
-            GROUP BY severity
-        """)
-        severity_counts = {row['severity']: row['count'] for row in cur.fetchall()}
+        with get_conn() as conn:
+            cur = conn.cursor()
 
-        # Count by status
-        cur.execute("""
-            SELECT status, COUNT(*) as count
-            FROM incidents
-            GROUP BY status
-        """)
-        status_counts = {row['status']: row['count'] for row in cur.fetchall()}
-
-        # Employee performance
-        cur.execute("""
-            SELECT
-                e.name,
-                e.role,
-                COUNT(i.incident_id) as incidents_handled,
-                AVG(i.response_time_seconds) as avg_response_seconds,
-                AVG(i.resolution_time_seconds) as avg_resolution_seconds
-            FROM incidents i
-            JOIN employees e ON i.resolved_by_employee_id = e.employee_id
-            WHERE i.status = 'RESOLVED'
-            GROUP BY e.employee_id, e.name, e.role
-            ORDER BY avg_response_seconds ASC
-        """)
-        employee_performance = cur.fetchall()
+            # One round trip: Postgres shapes all four pre-aggregated views
+            # (refreshed every minute) into a single JSON document
+            cur.execute("""
+                SELECT json_build_object(
+                    'times', (SELECT row_to_json(t) FROM incident_avg_times_mv t),
+                    'severity', (SELECT json_object_agg(COALESCE(severity, 'null'), count) FROM incident_severity_counts_mv),
+                    'status', (SELECT json_object_agg(status, count) FROM incident_status_counts_mv),
+                    'employees', (SELECT json_agg(e ORDER BY e.avg_response_seconds ASC)
+                                  FROM (SELECT name, role, incidents_handled, avg_response_seconds, avg_resolution_seconds
+                                        FROM employee_performance_mv) e)
+                )
+            """)
+            payload = cur.fetchone()[0]
+            cur.close()
 
-        cur.close()
-        return_db_connection(conn)
+        times = payload['times'] or {}
+        severity_counts = payload['severity'] or {}
+        status_counts = payload['status'] or {}
+        employee_performance = payload['employees'] or []
 
         metrics = {
             'average_times': {
-                'response_time_seconds': float(times['avg_response_time']) if times['avg_response_time'] else 0,
-                'response_time_minutes': float(times['avg_response_time']) / 60 if times['avg_response_time'] else 0,
-                'resolution_time_seconds': float(times['avg_resolution_time']) if times['avg_resolution_time'] else 0,
-                'resolution_time_minutes': float(times['avg_resolution_time']) / 60 if times['avg_resolution_time'] else 0,
-                'total_time_seconds': float(times['avg_total_time']) if times['avg_total_time'] else 0,
-                'total_time_minutes': float(times['avg_total_time']) / 60 if times['avg_total_time'] else 0
+                'response_time_seconds': float(times['avg_response_time']) if times.get('avg_response_time') else 0,
+                'response_time_minutes': float(times['avg_response_time']) / 60 if times.get('avg_response_time') else 0,
+                'resolution_time_seconds': float(times['avg_resolution_time']) if times.get('avg_resolution_time') else 0,
+                'resolution_time_minutes': float(times['avg_resolution_time']) / 60 if times.get('avg_resolution_time') else 0,
+                'total_time_seconds': float(times['avg_total_time']) if times.get('avg_total_time') else 0,
+                'total_time_minutes': float(times['avg_total_time']) / 60 if times.get('avg_total_time') else 0
             },
             'severity_counts': severity_counts,
             'status_counts': status_counts,
             'employee_performance': employee_performance
         }
 
-        return jsonify(metrics), 200
+        return ojsonify(metrics)
 
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -561,34 +828,30 @@ def get_metrics():
 def get_incident(incident_id):
     """Get specific incident details with history."""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        # Get history
-        cur.execute("""
-            SELECT * FROM incident_history 
-            WHERE incident_id = %s 
-            ORDER BY timestamp ASC
-        """, (incident_id,))
-        history = cur.fetchall()
-        
-        cur.close()
-        return_db_connection(conn)
-        
-        return jsonify({
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Get incident
+            cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
+            incident = cur.fetchone()
+
+            if not incident:
+                return jsonify({'error': 'Incident not found'}), 404
+
+            # Get history
+            cur.execute("""
+                SELECT * FROM incident_history
+                WHERE incident_id = %s
+                ORDER BY timestamp ASC
+            """, (incident_id,))
+            history = cur.fetchall()
+
+            cur.close()
+
+        return ojsonify({
             'incident': incident,
             'history': history
-        }), 200
+        })
         
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -605,46 +868,49 @@ def claim_incident(incident_id):
         if not employee_id or not employee_name:
             return jsonify({'error': 'employee_id and employee_name are required'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get current incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        # Can only claim if incident is OPEN, ASSIGNED, or ACKNOWLEDGED (not already in progress or resolved)
-        if incident['status'] not in ['OPEN', 'ASSIGNED', 'ACKNOWLEDGED']:
-            return jsonify({'error': f'Cannot claim incident with status {incident["status"]}. Only OPEN, ASSIGNED, or ACKNOWLEDGED incidents can be claimed.'}), 400
-        
-        previous_assignee = incident.get('assigned_to', 'Unassigned')
-        previous_status = incident['status']
-        
-        # Update incident assignment
-        cur.execute("""
-            UPDATE incidents 
-            SET assigned_to = %s,
-                assigned_employee_id = %s,
-                assigned_at = %s,
-                status = 'ACKNOWLEDGED'
-            WHERE incident_id = %s
-        """, (employee_name, employee_id, datetime.now(), incident_id))
-        
-        # Update or insert into incident_assignments
-        cur.execute("""
-            INSERT INTO incident_assignments (incident_id, employee_id, employee_name, is_primary)
-            VALUES (%s, %s, %s, TRUE)
-            ON CONFLICT (incident_id, employee_id) 
-            DO UPDATE SET is_primary = TRUE, assigned_at = NOW()
-        """, (incident_id, employee_id, employee_name))
-        
-        conn.commit()
-        
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Get current incident
+            cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
+            incident = cur.fetchone()
+
+            if not incident:
+                return jsonify({'error': 'Incident not found'}), 404
+
+            # Can only claim if incident is OPEN, ASSIGNED, or ACKNOWLEDGED (not already in progress or resolved)
+            if incident['status'] not in ['OPEN', 'ASSIGNED', 'ACKNOWLEDGED']:
+                return jsonify({'error': f'Cannot claim incident with status {incident["status"]}. Only OPEN, ASSIGNED, or ACKNOWLEDGED incidents can be claimed.'}), 400
+
+            previous_assignee = incident.get('assigned_to', 'Unassigned')
+            previous_status = incident['status']
+
+            # Update incident assignment
+            cur.execute("""
+                UPDATE incidents
+                SET assigned_to = %s,
+                    assigned_employee_id = %s,
+                    assigned_at = NOW(),
+                    status = 'ACKNOWLEDGED'
+                WHERE incident_id = %s
+            """, (employee_name, employee_id, incident_id))
+
+            # Update or insert into incident_assignments
+            cur.execute("""
+                INSERT INTO incident_assignments (incident_id, employee_id, employee_name, is_primary)
+                VALUES (%s, %s, %s, TRUE)
+                ON CONFLICT (incident_id, employee_id)
+                DO UPDATE SET is_primary = TRUE, assigned_at = NOW()
+            """, (incident_id, employee_id, employee_name))
+
+            conn.commit()
+
+            # Get updated incident
+            cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
+            updated_incident = cur.fetchone()
+
+            cur.close()
+
         print(f"✅ Incident {incident_id} claimed by {employee_name} (was: {previous_assignee})")
         
         # Add to history
@@ -666,7 +932,7 @@ def claim_incident(incident_id):
         # Send notification to previous assignee if there was one
         if incident.get('assigned_employee_id') and incident['assigned_employee_id'] != employee_id:
             try:
-                publish_notification({
+                queue_notification({
                     'type': 'INCIDENT_REASSIGNED',
                     'employee_id': incident['assigned_employee_id'],
                     'employee_name': incident['assigned_to'],
@@ -677,14 +943,7 @@ def claim_incident(incident_id):
                 })
             except Exception as e:
                 print(f"⚠️ Could not notify previous assignee: {e}")
-        
-        # Get updated incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        updated_incident = cur.fetchone()
-        
-        cur.close()
-        return_db_connection(conn)
-        
+
         return jsonify(updated_incident), 200
         
     except Exception as e:
@@ -699,55 +958,47 @@ def acknowledge_incident(incident_id):
         employee_id = data.get('employee_id')
         employee_name = data.get('employee_name')
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get current incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        if incident['status'] not in ['ASSIGNED', 'OPEN']:
-            return jsonify({'error': f'Cannot acknowledge incident with status {incident["status"]}'}), 400
-        
-        # Update to ACKNOWLEDGED
-        acknowledged_at = datetime.now()
-        cur.execute("""
-            UPDATE incidents 
-            SET status = 'ACKNOWLEDGED',
-                acknowledged_at = %s
-            WHERE incident_id = %s
-        """, (acknowledged_at, incident_id))
-        
-        conn.commit()
-        
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Guarded update in one round trip: the status check, the update and
+            # the refreshed row all happen atomically (no SELECT/UPDATE race)
+            cur.execute("EXECUTE inc_ack (%s)", (incident_id,))
+            updated_incident = cur.fetchone()
+
+            if not updated_incident:
+                # Distinguish missing incident from wrong state
+                cur.execute("SELECT status FROM incidents WHERE incident_id = %s", (incident_id,))
+                row = cur.fetchone()
+                if not row:
+                    return jsonify({'error': 'Incident not found'}), 404
+                return jsonify({'error': f'Cannot acknowledge incident with status {row["status"]}'}), 400
+
+            conn.commit()
+            cur.close()
+
+        previous_status = updated_incident.pop('prev_status')
+
         print(f"✅ Incident {incident_id} acknowledged by {employee_name}")
-        
+
         # Add to history
         add_to_history(
             incident_id,
             employee_id,
             employee_name,
             'ACKNOWLEDGED',
-            incident['status'],
+            previous_status,
             'ACKNOWLEDGED',
             'Employee acknowledged the incident'
         )
-        
-        # Calculate response time and record MTTA in Prometheus
-        calculate_time_metrics(incident_id)
-        if incident['created_at']:
-            mtta_seconds = (acknowledged_at - incident['created_at']).total_seconds()
-            incident_mtta_seconds.observe(mtta_seconds)
+
+        # Record MTTA in Prometheus (response_time_seconds was set in the UPDATE)
+        if updated_incident['response_time_seconds'] is not None:
+            incident_mtta_seconds.observe(updated_incident['response_time_seconds'])
 
         # Mark notification as read
         try:
-            notification_response = requests.patch(
+            notification_response = HTTP.patch(
                 f"{NOTIFICATION_SERVICE_URL}/notifications/incident/{incident_id}/mark-read",
                 json={'employee_id': employee_id},
                 timeout=3
@@ -756,14 +1007,7 @@ def acknowledge_incident(incident_id):
                 print(f"✅ Notification marked as read for incident {incident_id}")
         except Exception as e:
             print(f"⚠️ Could not mark notification as read: {e}")
-        
-        # Get updated incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        updated_incident = cur.fetchone()
-        
-        cur.close()
-        return_db_connection(conn)
-        
+
         return jsonify(updated_incident), 200
         
     except Exception as e:
@@ -779,35 +1023,25 @@ def start_incident(incident_id):
         employee_name = data.get('employee_name')
         note = data.get('note', 'Started working on incident')
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get current incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        if incident['status'] != 'ACKNOWLEDGED':
-            return jsonify({'error': f'Cannot start incident with status {incident["status"]}. Must be ACKNOWLEDGED first.'}), 400
-        
-        # Update to IN_PROGRESS
-        in_progress_at = datetime.now()
-        cur.execute("""
-            UPDATE incidents 
-            SET status = 'IN_PROGRESS',
-                in_progress_at = %s
-            WHERE incident_id = %s
-        """, (in_progress_at, incident_id))
-        
-        conn.commit()
-        
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Guarded update in one round trip (see acknowledge_incident)
+            cur.execute("EXECUTE inc_start (%s)", (incident_id,))
+            updated_incident = cur.fetchone()
+
+            if not updated_incident:
+                cur.execute("SELECT status FROM incidents WHERE incident_id = %s", (incident_id,))
+                row = cur.fetchone()
+                if not row:
+                    return jsonify({'error': 'Incident not found'}), 404
+                return jsonify({'error': f'Cannot start incident with status {row["status"]}. Must be ACKNOWLEDGED first.'}), 400
+
+            conn.commit()
+            cur.close()
+
         print(f"✅ Incident {incident_id} started by {employee_name}")
-        
+
         # Add to history
         add_to_history(
             incident_id,
@@ -818,14 +1052,7 @@ def start_incident(incident_id):
             'IN_PROGRESS',
             note
         )
-        
-        # Get updated incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        updated_incident = cur.fetchone()
-        
-        cur.close()
-        return_db_connection(conn)
-        
+
         return jsonify(updated_incident), 200
         
     except Exception as e:
@@ -844,30 +1071,34 @@ def add_note(incident_id):
         if not note or len(note.strip()) == 0:
             return jsonify({'error': 'Note cannot be empty'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get current incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        # Append note to intermediate_notes array
-        cur.execute("""
-            UPDATE incidents 
-            SET intermediate_notes = array_append(COALESCE(intermediate_notes, ARRAY[]::TEXT[]), %s)
-            WHERE incident_id = %s
-        """, (f"[{datetime.now().strftime('%H:%M:%S')}] {note}", incident_id))
-        
-        conn.commit()
-        
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Get current incident
+            cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
+            incident = cur.fetchone()
+
+            if not incident:
+                return jsonify({'error': 'Incident not found'}), 404
+
+            # Append note to intermediate_notes array, timestamped server-side
+            cur.execute("""
+                UPDATE incidents
+                SET intermediate_notes = array_append(COALESCE(intermediate_notes, ARRAY[]::TEXT[]),
+                                                      '[' || to_char(NOW(), 'HH24:MI:SS') || '] ' || %s)
+                WHERE incident_id = %s
+            """, (note, incident_id))
+
+            conn.commit()
+
+            # Get updated incident
+            cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
+            updated_incident = cur.fetchone()
+
+            cur.close()
+
         print(f"✅ Note added to incident {incident_id} by {employee_name}")
-        
+
         # Add to history
         add_to_history(
             incident_id,
@@ -878,14 +1109,7 @@ def add_note(incident_id):
             incident['status'],
             note
         )
-        
-        # Get updated incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        updated_incident = cur.fetchone()
-        
-        cur.close()
-        return_db_connection(conn)
-        
+
         return jsonify(updated_incident), 200
         
     except Exception as e:
@@ -905,61 +1129,42 @@ def resolve_incident(incident_id):
         if not resolution_notes or len(resolution_notes.strip()) < 10:
             return jsonify({'error': 'Resolution notes are required (minimum 10 characters)'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get current incident
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        incident = cur.fetchone()
-        
-        if not incident:
-            return jsonify({'error': 'Incident not found'}), 404
-        
-        if incident['status'] == 'RESOLVED':
-            return jsonify({'error': 'Incident already resolved'}), 400
-        
-        # Update to RESOLVED
-        resolved_at = datetime.now()
-        cur.execute("""
-            UPDATE incidents 
-            SET status = 'RESOLVED',
-                resolved_at = %s,
-                resolution_notes = %s,
-                resolved_by_employee_id = %s
-            WHERE incident_id = %s
-        """, (resolved_at, resolution_notes, employee_id, incident_id))
-        
-        conn.commit()
-        
+        with get_conn() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+
+            # Guarded update in one round trip (see acknowledge_incident)
+            cur.execute("EXECUTE inc_resolve (%s, %s, %s)", (resolution_notes, employee_id, incident_id))
+            updated_incident = cur.fetchone()
+
+            if not updated_incident:
+                cur.execute("SELECT status FROM incidents WHERE incident_id = %s", (incident_id,))
+                row = cur.fetchone()
+                if not row:
+                    return jsonify({'error': 'Incident not found'}), 404
+                return jsonify({'error': 'Incident already resolved'}), 400
+
+            conn.commit()
+            cur.close()
+
+        previous_status = updated_incident.pop('prev_status')
+
         print(f"✅ Incident {incident_id} resolved by {employee_name}")
-        
+
         # Add to history
         add_to_history(
             incident_id,
             employee_id,
             employee_name,
             'INCIDENT_RESOLVED',
-            incident['status'],
+            previous_status,
             'RESOLVED',
             resolution_notes
         )
-        
-        # Calculate all time metrics and record MTTR in Prometheus
-        calculate_time_metrics(incident_id)
-        if incident['created_at']:
-            mttr_seconds = (resolved_at - incident['created_at']).total_seconds()
-            incident_mttr_seconds.observe(mttr_seconds)
-
-        # Get updated incident with metrics
-        cur.execute("SELECT * FROM incidents WHERE incident_id = %s", (incident_id,))
-        updated_incident = cur.fetchone()
-        
-        cur.close()
-        return_db_connection(conn)
-        
+
+        # Record MTTR in Prometheus (total_time_seconds was set in the UPDATE)
+        if updated_incident['total_time_seconds'] is not None:
+            incident_mttr_seconds.observe(updated_incident['total_time_seconds'])
+
         return jsonify(updated_incident), 200
         
     except Exception as e: